@@ -1,293 +1,791 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-
-"""
-AI Travel Assistant — vCloud (location fix)
-- Primary: precise browser GPS via streamlit-js-eval (Promise-based)
-- Fallbacks: multi-provider IP (ipapi -> ipinfo -> ipwho), then hard fallback = Karachi
-- Reverse geocoding: Nominatim (English) with Open-Meteo backup
-- Manual city search override
-"""
-
-import os
-import math
-import requests
-import pandas as pd
-import streamlit as st
-from urllib.parse import quote_plus
-
-# ---- JS bridge for geolocation (Promise so we actually get a value) ----
-# streamlit-js-eval >= 0.1.7 required
-from streamlit_js_eval import streamlit_js_eval
-
-APP_TITLE = "🌍 AI Travel Assistant — vCloud"
-USER_AGENT = "ai-travel-assistant/vcloud (contact: you@example.com)"
-
-st.set_page_config(page_title="AI Travel Assistant", layout="wide")
-
-# ======================= Geocoding helpers =======================
-@st.cache_data(show_spinner=False, ttl=60 * 60)
-def geocode_city(city: str):
-    """Open-Meteo forward geocoder."""
-    try:
-        url = (
-            "https://geocoding-api.open-meteo.com/v1/search"
-            f"?name={quote_plus(city)}&count=1&language=en&format=json"
-        )
-        r = requests.get(url, timeout=20)
-        r.raise_for_status()
-        data = r.json()
-        if not data.get("results"):
-            return None
-        res = data["results"][0]
-        return {
-            "name": res.get("name"),
-            "admin1": res.get("admin1"),
-            "country": res.get("country"),
-            "lat": float(res["latitude"]),
-            "lon": float(res["longitude"]),
-            "timezone": res.get("timezone"),
-            "source": "search:open-meteo",
-        }
-    except Exception:
-        return None
-
-
-@st.cache_data(show_spinner=False, ttl=60 * 60)
-def reverse_geocode(lat: float, lon: float):
-    """Try Nominatim; fall back to Open-Meteo reverse."""
-    # Nominatim (English)
-    try:
-        nomi = (
-            "https://nominatim.openstreetmap.org/reverse"
-            f"?format=json&lat={lat}&lon={lon}&zoom=10&addressdetails=1"
-        )
-        r = requests.get(
-            nomi,
-            timeout=12,
-            headers={"User-Agent": USER_AGENT, "Accept-Language": "en"},
-        )
-        r.raise_for_status()
-        j = r.json()
-        addr = j.get("address", {}) if isinstance(j, dict) else {}
-        name = (
-            addr.get("city")
-            or addr.get("town")
-            or addr.get("village")
-            or addr.get("municipality")
-            or addr.get("county")
-        )
-        admin1 = addr.get("state") or addr.get("region")
-        country = addr.get("country")
-        if name or admin1 or country:
-            return {
-                "name": name,
-                "admin1": admin1,
-                "country": country,
-                "timezone": None,
-                "source": "reverse:nominatim",
-            }
-    except Exception:
-        pass
-
-    # Open-Meteo reverse backup
-    try:
-        url = (
-            "https://geocoding-api.open-meteo.com/v1/reverse"
-            f"?latitude={lat}&longitude={lon}&language=en&format=json"
-        )
-        r = requests.get(url, timeout=12)
-        r.raise_for_status()
-        j = r.json()
-        if j.get("results"):
-            r0 = j["results"][0]
-            return {
-                "name": r0.get("name"),
-                "admin1": r0.get("admin1"),
-                "country": r0.get("country"),
-                "timezone": r0.get("timezone"),
-                "source": "reverse:open-meteo",
-            }
-    except Exception:
-        pass
-
-    return {}
-
-
-@st.cache_data(show_spinner=False, ttl=15 * 60)
-def ip_detect():
-    """Try multiple IP providers for coarse location."""
-    providers = [
-        ("ipapi.co", "https://ipapi.co/json", lambda j: {
-            "city": j.get("city"),
-            "admin1": j.get("region"),
-            "country": j.get("country_name") or j.get("country"),
-            "lat": j.get("latitude"),
-            "lon": j.get("longitude"),
-            "timezone": j.get("timezone")
-        }),
-        ("ipinfo.io", "https://ipinfo.io/json", lambda j: None if "loc" not in j else {
-            "city": j.get("city"),
-            "admin1": j.get("region"),
-            "country": j.get("country"),
-            "lat": float(j["loc"].split(",")[0]),
-            "lon": float(j["loc"].split(",")[1]),
-            "timezone": j.get("timezone")
-        }),
-        ("ipwho.is", "https://ipwho.is", lambda j: None if j.get("success") is False else {
-            "city": j.get("city"),
-            "admin1": j.get("region"),
-            "country": j.get("country"),
-            "lat": j.get("latitude"),
-            "lon": j.get("longitude"),
-            "timezone": j.get("timezone")
-        }),
-    ]
-    for name, url, parser in providers:
-        try:
-            r = requests.get(url, timeout=10)
-            r.raise_for_status()
-            parsed = parser(r.json())
-            if parsed and parsed.get("lat") and parsed.get("lon"):
-                parsed["source"] = f"ip:{name}"
-                # normalize floats
-                parsed["lat"] = float(parsed["lat"])
-                parsed["lon"] = float(parsed["lon"])
-                return parsed
-        except Exception:
-            continue
-    return None
-
-
-def set_session_location(meta: dict):
-    """Normalize and store into session."""
-    st.session_state["location"] = {
-        "name": meta.get("name"),
-        "admin1": meta.get("admin1"),
-        "country": meta.get("country"),
-        "lat": meta.get("lat"),
-        "lon": meta.get("lon"),
-        "timezone": meta.get("timezone"),
-        "source": meta.get("source"),
-    }
-
-
-# ======================= UI =======================
-st.title(APP_TITLE)
-st.caption(
-    "Auto-locate → show weather, nearby restaurants, attractions, and local news. Karachi is the strict fallback."
-)
-
-with st.sidebar:
-    st.header("Controls")
-    query_city = st.text_input("Search city (e.g., Dubai, Karachi, London)")
-    use_city_btn = st.button("Use searched city")
-    st.divider()
-
-    st.subheader("📍 Location options")
-    get_loc_btn = st.button("Get my location (GPS)")
-    st.caption(
-        "If clicking does nothing: allow location access in the site permissions (🔒 icon) and click again."
-    )
-
-# 1) Manual typed city
-if use_city_btn and query_city.strip():
-    g = geocode_city(query_city.strip())
-    if g:
-        g["source"] = "manual:search"
-        set_session_location(g)
-        st.success(f"Using searched city: **{g['name']}**")
-    else:
-        st.warning("Could not find that city. Check the spelling and try again.")
-
-# 2) Browser GPS via JS (Promise)
-elif get_loc_btn:
-    js = """
-    new Promise((resolve) => {
-      try {
-        if (!navigator.geolocation) {
-          resolve({error: "Geolocation API not available"});
-          return;
-        }
-        navigator.geolocation.getCurrentPosition(
-          (pos) => resolve({
-            lat: pos.coords.latitude,
-            lon: pos.coords.longitude,
-            acc: pos.coords.accuracy
-          }),
-          (err) => resolve({error: err && err.message ? err.message : "permission denied"})
-        );
-      } catch (e) {
-        resolve({error: e.message || "unknown error"});
-      }
-    })
-    """
-    result = streamlit_js_eval(js_expressions=js, key="get_gps_v2", want_output=True)
-    if isinstance(result, dict) and "lat" in result and "lon" in result:
-        lat, lon = float(result["lat"]), float(result["lon"])
-        rev = reverse_geocode(lat, lon) or {}
-        meta = {
-            "name": rev.get("name"),
-            "admin1": rev.get("admin1"),
-            "country": rev.get("country"),
-            "lat": lat,
-            "lon": lon,
-            "timezone": rev.get("timezone"),
-            "source": "browser:gps",
-        }
-        set_session_location(meta)
-        st.success(f"Browser location detected: **{lat:.4f}, {lon:.4f}**")
-    else:
-        st.warning("Could not fetch browser location. Please allow access and click again.")
-
-# 3) First load / fallback chain
-if "location" not in st.session_state:
-    ip = ip_detect()
-    if ip:
-        # Improve IP result with reverse geocode for nicer city label
-        rev = reverse_geocode(ip["lat"], ip["lon"]) or {}
-        ip["name"] = rev.get("name") or ip.get("city")
-        ip["admin1"] = rev.get("admin1") or ip.get("admin1")
-        ip["country"] = rev.get("country") or ip.get("country")
-        set_session_location(ip)
-        st.warning("⚠️ Using IP-based location (less accurate).")
-    else:
-        # hard fallback to Karachi
-        k = geocode_city("Karachi") or {
-            "name": "Karachi",
-            "admin1": "Sindh",
-            "country": "Pakistan",
-            "lat": 24.8607,
-            "lon": 67.0011,
-            "timezone": "Asia/Karachi",
-        }
-        k["source"] = "fallback"
-        set_session_location(k)
-        st.warning("Using strict fallback: Karachi.")
-
-# ======================= Display Active Location =======================
-meta = st.session_state["location"]
-st.subheader("📍 Active Location")
-
-cols = st.columns(4)
-cols[0].metric("Location", meta.get("name") or "—")
-cols[1].metric("Region", meta.get("admin1") or "—")
-cols[2].metric("Country", meta.get("country") or "—")
-cols[3].metric("Timezone", meta.get("timezone") or "—")
-
-st.caption(
-    f"Source: **{meta.get('source','?')}** • Coords: `{meta.get('lat'):.4f}, {meta.get('lon'):.4f}`"
-    if meta.get("lat") and meta.get("lon")
-    else f"Source: **{meta.get('source','?')}**"
-)
-
-# A tiny map pin (Streamlit's built-in map)
-try:
-    df = pd.DataFrame([{"lat": meta.get("lat"), "lon": meta.get("lon")}])
-    if pd.notna(df.iloc[0]["lat"]) and pd.notna(df.iloc[0]["lon"]):
-        st.map(df, size=100, zoom=11)  # Streamlit 1.50 still supports this; OK to ignore deprecation notice.
-except Exception:
-    pass
-
-with st.expander("Debug: raw location dict"):
-    st.json(meta)
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AI Travel Assistant — vCloud (location fix)
+- Primary: precise browser GPS via streamlit-js-eval (Promise-based)
+- Fallbacks: multi-provider IP (ipapi -> ipinfo -> ipwho), then hard fallback = Karachi
+- Reverse geocoding: Nominatim (English) with Open-Meteo backup
+- Manual city search override
+- Results: weather, nearby attractions, restaurants, and local news
+"""
+
+import io
+import os
+import math
+import threading
+import time
+import diskcache
+import ijson
+import orjson
+import numpy as np
+import streamlit as st
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from requests.adapters import HTTPAdapter
+from requests_cache import CachedSession
+from urllib3.util import Retry
+
+APP_TITLE = "🌍 AI Travel Assistant — vCloud"
+USER_AGENT = "ai-travel-assistant/vcloud (contact: you@example.com)"
+
+# Strict fallback when every detection path fails — a literal, so the
+# failure path never touches the network again.
+FALLBACK_LOCATION = {
+    "name": "Karachi",
+    "admin1": "Sindh",
+    "country": "Pakistan",
+    "lat": 24.8607,
+    "lon": 67.0011,
+    "timezone": "Asia/Karachi",
+    "source": "fallback",
+}
+
+st.set_page_config(page_title="AI Travel Assistant", layout="wide")
+
+# ---- Shared HTTP session: keep-alive pooling + retry on transient errors ----
+@st.cache_resource(show_spinner=False)
+def get_session() -> CachedSession:
+    """One pooled, disk-cached session per server process.
+
+    The SQLite response cache survives Streamlit Cloud restarts, and
+    stale_if_error serves the last good response if an upstream is down.
+    """
+    s = CachedSession(
+        ".http_cache",
+        backend="sqlite",
+        expire_after=600,
+        allowable_methods=("GET", "POST"),
+        urls_expire_after={
+            "*overpass-api.de*": 30 * 60,
+            "*wikipedia.org*": 30 * 60,
+            "*open-meteo.com*": 10 * 60,
+            "*nominatim*": 60 * 60,
+        },
+        cache_control=True,
+        stale_if_error=True,
+    )
+    # brotli is installed, so urllib3 can decode br; smaller bodies than gzip.
+    s.headers.update({"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, br"})
+    s.mount(
+        "https://",
+        HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=16,
+            max_retries=Retry(
+                total=2, backoff_factor=0.2, status_forcelist=[429, 502, 503, 504]
+            ),
+        ),
+    )
+    return s
+
+
+@st.cache_resource(show_spinner=False)
+def get_executor() -> ThreadPoolExecutor:
+    """One shared pool for every parallel fetch (fan-out, IP race)."""
+    return ThreadPoolExecutor(max_workers=8)
+
+
+SESSION = get_session()
+EXEC = get_executor()
+
+# Function-level disk cache for geocoding/IP lookups: st.cache_data is
+# in-memory per process, so this is what survives restarts and workers.
+DISK = diskcache.Cache(".cache")
+
+# ---- Single-flight GETs: concurrent identical requests share one result ----
+_INFLIGHT: dict = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+
+def _dedup_get(url: str, **kwargs):
+    """SESSION.get with in-flight dedupe keyed on URL + params.
+
+    The first caller performs the request in its own thread and publishes
+    the response (or exception) on a Future; concurrent duplicates just
+    await that Future instead of re-hitting the endpoint.
+    """
+    key = (url, tuple(sorted((kwargs.get("params") or {}).items())))
+    with _INFLIGHT_LOCK:
+        fut = _INFLIGHT.get(key)
+        leader = fut is None
+        if leader:
+            fut = Future()
+            _INFLIGHT[key] = fut
+    if leader:
+        try:
+            fut.set_result(SESSION.get(url, **kwargs))
+        except Exception as exc:
+            fut.set_exception(exc)
+        finally:
+            with _INFLIGHT_LOCK:
+                _INFLIGHT.pop(key, None)
+    return fut.result()
+
+
+# ======================= Geocoding helpers =======================
+@st.cache_data(show_spinner=False, ttl=24 * 60 * 60)
+def geocode_city(city: str):
+    """Open-Meteo forward geocoder."""
+    key = ("geocode", city.lower().strip())
+    hit = DISK.get(key)
+    if hit is not None:
+        return hit
+    try:
+        r = _dedup_get(
+            "https://geocoding-api.open-meteo.com/v1/search",
+            params={"name": city, "count": 1, "language": "en", "format": "json"},
+            timeout=(3, 6),
+        )
+        r.raise_for_status()
+        data = orjson.loads(r.content)
+        if not data.get("results"):
+            return None
+        res = data["results"][0]
+        out = {
+            "name": res.get("name"),
+            "admin1": res.get("admin1"),
+            "country": res.get("country"),
+            "lat": float(res["latitude"]),
+            "lon": float(res["longitude"]),
+            "timezone": res.get("timezone"),
+            "source": "search:open-meteo",
+        }
+        DISK.set(key, out, expire=24 * 60 * 60)
+        return out
+    except Exception:
+        return None
+
+
+# Nominatim's usage policy is a hard 1 req/s; gate our calls so bursty
+# Streamlit reruns never draw a 403.
+_NOMI_LAST = [0.0]
+_NOMI_LOCK = threading.Lock()
+
+
+def _nominatim_rate_gate():
+    with _NOMI_LOCK:
+        delay = max(0.0, 1.0 - (time.monotonic() - _NOMI_LAST[0]))
+        if delay:
+            time.sleep(delay)
+        _NOMI_LAST[0] = time.monotonic()
+
+
+def _q(x) -> float:
+    """Quantize a coordinate to ~1.1 km so jittery GPS fixes share cache keys."""
+    return round(float(x), 2)
+
+
+def reverse_geocode(lat: float, lon: float):
+    """Cache-friendly wrapper; 1 km precision loss is below city zoom."""
+    return _reverse_geocode_q(_q(lat), _q(lon))
+
+
+def _nominatim_rev(lat: float, lon: float):
+    """Nominatim reverse (English); None on failure or empty answer."""
+    try:
+        _nominatim_rate_gate()
+        r = _dedup_get(
+            "https://nominatim.openstreetmap.org/reverse",
+            params={
+                "format": "json",
+                "lat": lat,
+                "lon": lon,
+                "zoom": 10,
+                "addressdetails": 1,
+            },
+            timeout=(3, 5),
+            headers={"Accept-Language": "en"},
+        )
+        r.raise_for_status()
+        j = orjson.loads(r.content)
+        addr = j.get("address", {}) if isinstance(j, dict) else {}
+        name = (
+            addr.get("city")
+            or addr.get("town")
+            or addr.get("village")
+            or addr.get("municipality")
+            or addr.get("county")
+        )
+        admin1 = addr.get("state") or addr.get("region")
+        country = addr.get("country")
+        if name or admin1 or country:
+            return {
+                "name": name,
+                "admin1": admin1,
+                "country": country,
+                "timezone": None,
+                "source": "reverse:nominatim",
+            }
+    except Exception:
+        pass
+    return None
+
+
+def _openmeteo_rev(lat: float, lon: float):
+    """Open-Meteo reverse; None on failure or empty answer."""
+    try:
+        r = _dedup_get(
+            "https://geocoding-api.open-meteo.com/v1/reverse",
+            params={"latitude": lat, "longitude": lon, "language": "en", "format": "json"},
+            timeout=(3, 5),
+        )
+        r.raise_for_status()
+        j = orjson.loads(r.content)
+        if j.get("results"):
+            r0 = j["results"][0]
+            return {
+                "name": r0.get("name"),
+                "admin1": r0.get("admin1"),
+                "country": r0.get("country"),
+                "timezone": r0.get("timezone"),
+                "source": "reverse:open-meteo",
+            }
+    except Exception:
+        pass
+    return None
+
+
+def _result_or_none(fut, timeout=None):
+    try:
+        return fut.result(timeout=timeout)
+    except Exception:
+        return None
+
+
+@st.cache_data(show_spinner=False, ttl=24 * 60 * 60)
+def _reverse_geocode_q(lat: float, lon: float):
+    """Race Nominatim against Open-Meteo reverse; prefer Nominatim's labels."""
+    key = ("reverse", lat, lon)
+    hit = DISK.get(key)
+    if hit is not None:
+        return hit
+    f_nomi = EXEC.submit(_nominatim_rev, lat, lon)
+    f_om = EXEC.submit(_openmeteo_rev, lat, lon)
+    wait([f_nomi, f_om], return_when=FIRST_COMPLETED)
+    # Nominatim gives the richer English names, so when Open-Meteo merely
+    # finished first, grant Nominatim a short grace window before settling.
+    out = _result_or_none(f_nomi, timeout=None if f_nomi.done() else 0.2)
+    if out is None:
+        out = _result_or_none(f_om)
+    if out is None:
+        out = _result_or_none(f_nomi)
+    if out:
+        DISK.set(key, out, expire=30 * 24 * 60 * 60)
+        return out
+    return {}
+
+
+@st.cache_data(show_spinner=False, ttl=15 * 60)
+def ip_detect():
+    """Try multiple IP providers for coarse location."""
+    key = ("ip-detect",)
+    hit = DISK.get(key)
+    if hit is not None:
+        return hit
+    providers = [
+        ("ipapi.co", "https://ipapi.co/json", lambda j: {
+            "city": j.get("city"),
+            "admin1": j.get("region"),
+            "country": j.get("country_name") or j.get("country"),
+            "lat": j.get("latitude"),
+            "lon": j.get("longitude"),
+            "timezone": j.get("timezone")
+        }),
+        ("ipinfo.io", "https://ipinfo.io/json", lambda j: None if "loc" not in j else {
+            "city": j.get("city"),
+            "admin1": j.get("region"),
+            "country": j.get("country"),
+            "lat": float(j["loc"].split(",")[0]),
+            "lon": float(j["loc"].split(",")[1]),
+            "timezone": j.get("timezone")
+        }),
+        ("ipwho.is", "https://ipwho.is", lambda j: None if j.get("success") is False else {
+            "city": j.get("city"),
+            "admin1": j.get("region"),
+            "country": j.get("country"),
+            "lat": j.get("latitude"),
+            "lon": j.get("longitude"),
+            "timezone": j.get("timezone")
+        }),
+    ]
+    def _fetch(name, url, parser):
+        r = SESSION.get(url, timeout=(3, 6))
+        r.raise_for_status()
+        parsed = parser(orjson.loads(r.content))
+        if parsed and parsed.get("lat") and parsed.get("lon"):
+            parsed["source"] = f"ip:{name}"
+            # normalize floats
+            parsed["lat"] = float(parsed["lat"])
+            parsed["lon"] = float(parsed["lon"])
+            return parsed
+        return None
+
+    # Race all providers; first valid answer wins instead of paying for a
+    # slow/failing provider before trying the next. 10 s is the total budget;
+    # losers finish (ignored) on the shared pool.
+    try:
+        futs = [EXEC.submit(_fetch, *p) for p in providers]
+        for f in as_completed(futs, timeout=10):
+            try:
+                parsed = f.result()
+            except Exception:
+                continue
+            if parsed:
+                DISK.set(key, parsed, expire=15 * 60)
+                return parsed
+    except Exception:
+        pass
+    return None
+
+
+def set_session_location(meta: dict):
+    """Normalize and store into session."""
+    st.session_state["location"] = {
+        "name": meta.get("name"),
+        "admin1": meta.get("admin1"),
+        "country": meta.get("country"),
+        "lat": meta.get("lat"),
+        "lon": meta.get("lon"),
+        "timezone": meta.get("timezone"),
+        "source": meta.get("source"),
+    }
+
+
+# ======================= Distance helpers =======================
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Vectorized haversine from one point to arrays of points, in km."""
+    cos_lat0 = math.cos(math.radians(lat))  # reference point: compute once, not per row
+    dphi = np.deg2rad(lats - lat)
+    dlmb = np.deg2rad(lons - lon)
+    a = (
+        np.sin(dphi / 2) ** 2
+        + cos_lat0 * np.cos(np.deg2rad(lats)) * np.sin(dlmb / 2) ** 2
+    )
+    return 2 * 6371.0 * np.arcsin(np.sqrt(a))
+
+
+def bbox_from_center(lat: float, lon: float, radius_km: float):
+    """Approximate (south, west, north, east) box around a point."""
+    dlat = radius_km / 111.0
+    dlon = radius_km / (111.0 * max(0.1, math.cos(math.radians(lat))))
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+
+# ======================= Data sources =======================
+_OVERPASS_Q = (
+    "[out:json][timeout:25][bbox:{s},{w},{n},{e}];"
+    'nwr["amenity"="restaurant"]["name"];'
+    "out center tags;"
+)
+
+
+
+def get_weather(lat: float, lon: float, tz: str = "auto"):
+    """Cache-friendly wrapper; 1 km is well below Open-Meteo's ~11 km grid."""
+    return _get_weather_q(_q(lat), _q(lon), tz)
+
+
+@st.cache_data(show_spinner=False, ttl=10 * 60)
+def _get_weather_q(lat: float, lon: float, tz: str = "auto"):
+    """Open-Meteo current conditions plus daily hi/lo."""
+    try:
+        r = _dedup_get(
+            "https://api.open-meteo.com/v1/forecast",
+            params={
+                "latitude": lat,
+                "longitude": lon,
+                "current": "temperature_2m,apparent_temperature,relative_humidity_2m,wind_speed_10m",
+                # only what the UI shows: today's hi/lo, nothing more
+                "daily": "temperature_2m_max,temperature_2m_min",
+                "forecast_days": 1,
+                "timezone": tz,
+            },
+            timeout=(3, 6),
+        )
+        r.raise_for_status()
+        return orjson.loads(r.content)
+    except Exception:
+        return None
+
+
+@st.cache_data(show_spinner=False, ttl=30 * 60)
+def get_attractions(lat: float, lon: float, radius_m: int = 10000, limit: int = 8):
+    """Wikipedia geosearch, then one batched extracts call for all titles."""
+    try:
+        r = _dedup_get(
+            "https://en.wikipedia.org/w/api.php",
+            params={
+                "action": "query",
+                "list": "geosearch",
+                "gscoord": f"{lat}|{lon}",
+                "gsradius": radius_m,
+                "gslimit": limit,
+                "format": "json",
+            },
+            timeout=(3, 6),
+        )
+        r.raise_for_status()
+        items = orjson.loads(r.content).get("query", {}).get("geosearch", [])
+        # Dedupe repeated titles (redirects etc.), keeping the nearest hit —
+        # geosearch returns results ordered by distance.
+        dist_by_title: dict = {}
+        for it in items:
+            if it.get("title"):
+                dist_by_title.setdefault(it["title"], it.get("dist", 0))
+        if not dist_by_title:
+            return []
+        # One request for every summary instead of a call per title.
+        re_ = _dedup_get(
+            "https://en.wikipedia.org/w/api.php",
+            params={
+                "action": "query",
+                "prop": "extracts|info",
+                "exintro": 1,
+                "explaintext": 1,
+                "inprop": "url",
+                "format": "json",
+                "titles": "|".join(dist_by_title),
+            },
+            timeout=(3, 6),
+        )
+        re_.raise_for_status()
+        pages = (orjson.loads(re_.content).get("query") or {}).get("pages") or {}
+        out = []
+        for p in pages.values():
+            title = p.get("title")
+            if title not in dist_by_title:
+                continue
+            out.append({
+                "title": title,
+                "distance_km": round(dist_by_title[title] / 1000.0, 2),
+                "summary": p.get("extract") or "",
+                "url": p.get("fullurl"),
+            })
+        out.sort(key=lambda a: a["distance_km"])
+        return out
+    except Exception:
+        return []
+
+
+@st.cache_data(show_spinner=False, ttl=30 * 60)
+def get_restaurants(lat: float, lon: float, radius_km: float = 5.0, limit: int = 30):
+    """Named restaurants near the point via OSM Overpass."""
+    try:
+        s, w, n, e = bbox_from_center(lat, lon, radius_km)
+        query = _OVERPASS_Q.format(s=s, w=w, n=n, e=e)
+        r = SESSION.post(
+            "https://overpass-api.de/api/interpreter",
+            data=query.encode("utf-8"),
+            timeout=(3, 60),
+        )
+        r.raise_for_status()
+
+        # Decode elements incrementally and keep only a bounded top-K
+        # candidate set, so parsed-object memory stays O(limit + chunk)
+        # instead of O(element count). The CachedSession buffers the raw
+        # bytes either way (it has to store them), so iterate over
+        # r.content — unlike r.raw, that replays correctly on cache hits
+        # and stale-if-error responses.
+        best_tags: list = []
+        best_dist = np.empty(0, dtype=np.float64)
+        buf_tags, buf_lats, buf_lons = [], [], []
+
+        def _merge():
+            nonlocal best_tags, best_dist
+            dist = haversine_km(
+                lat,
+                lon,
+                np.asarray(buf_lats, dtype=np.float64),
+                np.asarray(buf_lons, dtype=np.float64),
+            )
+            all_tags = best_tags + buf_tags
+            all_dist = np.concatenate([best_dist, dist])
+            k = min(limit, len(all_tags))
+            idx = np.argpartition(all_dist, k - 1)[:k]
+            best_tags = [all_tags[i] for i in idx]
+            best_dist = all_dist[idx]
+            buf_tags.clear(), buf_lats.clear(), buf_lons.clear()
+
+        for el in ijson.items(io.BytesIO(r.content), "elements.item"):
+            tags = el.get("tags") or {}
+            name = tags.get("name")
+            rlat = el.get("lat") or (el.get("center") or {}).get("lat")
+            rlon = el.get("lon") or (el.get("center") or {}).get("lon")
+            if not name or rlat is None or rlon is None:
+                continue
+            buf_tags.append(tags)
+            buf_lats.append(float(rlat))
+            buf_lons.append(float(rlon))
+            if len(buf_tags) >= 512:
+                _merge()
+        if buf_tags:
+            _merge()
+        if not best_tags:
+            return []
+        order = np.argsort(best_dist)
+        return [
+            {
+                "name": best_tags[i]["name"],
+                "cuisine": (best_tags[i].get("cuisine") or "").replace(";", ", "),
+                "address": ", ".join(
+                    x
+                    for x in [
+                        best_tags[i].get("addr:street"),
+                        best_tags[i].get("addr:city"),
+                    ]
+                    if x
+                ),
+                "distance_km": round(float(best_dist[i]), 2),
+            }
+            for i in order
+        ]
+    except Exception:
+        return []
+
+
+@st.cache_data(show_spinner=False, ttl=15 * 60)
+def get_local_news(place: str, max_items: int = 10):
+    """Google News RSS for the active place."""
+    from defusedxml import ElementTree  # deferred: only needed here
+
+    try:
+        r = _dedup_get(
+            "https://news.google.com/rss/search",
+            params={"q": place, "hl": "en", "gl": "US", "ceid": "US:en"},
+            timeout=(3, 5),
+        )
+        r.raise_for_status()
+        # We only need three fields per item; a plain (defused) XML walk is
+        # far cheaper than feedparser's full sanitizing pipeline.
+        root = ElementTree.fromstring(r.content)
+        return [
+            {
+                "title": item.findtext("title"),
+                "link": item.findtext("link"),
+                "published": item.findtext("pubDate"),
+            }
+            for item in root.findall("./channel/item")[:max_items]
+        ]
+    except Exception:
+        return []
+
+
+def fetch_all(meta: dict, radius_km: float, max_restaurants: int, news_count: int):
+    """Run the four independent API calls concurrently (all network-bound)."""
+    lat, lon = meta.get("lat"), meta.get("lon")
+    tz = meta.get("timezone") or "auto"
+    place = meta.get("name") or meta.get("country") or "Karachi"
+    f_weather = EXEC.submit(get_weather, lat, lon, tz)
+    f_attr = EXEC.submit(get_attractions, lat, lon)
+    f_rest = EXEC.submit(get_restaurants, lat, lon, radius_km, max_restaurants)
+    f_news = EXEC.submit(get_local_news, place, news_count)
+    return f_weather.result(), f_attr.result(), f_rest.result(), f_news.result()
+
+
+# ======================= UI =======================
+st.title(APP_TITLE)
+st.caption(
+    "Auto-locate → show weather, nearby restaurants, attractions, and local news. Karachi is the strict fallback."
+)
+
+with st.sidebar:
+    st.header("Controls")
+    query_city = st.text_input("Search city (e.g., Dubai, Karachi, London)")
+    use_city_btn = st.button("Use searched city")
+    st.divider()
+
+    st.subheader("📍 Location options")
+    get_loc_btn = st.button("Get my location (GPS)")
+    st.caption(
+        "If clicking does nothing: allow location access in the site permissions (🔒 icon) and click again."
+    )
+    st.divider()
+
+    st.subheader("🔎 Results")
+    radius_km = st.slider("Restaurant radius (km)", 2, 20, 5)
+    max_restaurants = st.slider("Max restaurants", 5, 50, 30)
+    news_count = st.slider("News items", 3, 20, 10)
+
+# 1) Manual typed city
+if use_city_btn and query_city.strip():
+    g = geocode_city(query_city.strip())
+    if g:
+        g["source"] = "manual:search"
+        set_session_location(g)
+        st.success(f"Using searched city: **{g['name']}**")
+    else:
+        st.warning("Could not find that city. Check the spelling and try again.")
+
+# 2) Browser GPS via JS (Promise)
+elif get_loc_btn:
+    # JS bridge for geolocation (streamlit-js-eval >= 0.1.7); deferred so
+    # cold start doesn't pay for it before the button is ever clicked.
+    from streamlit_js_eval import streamlit_js_eval
+
+    js = """
+    new Promise((resolve) => {
+      try {
+        if (!navigator.geolocation) {
+          resolve({error: "Geolocation API not available"});
+          return;
+        }
+        navigator.geolocation.getCurrentPosition(
+          (pos) => resolve({
+            lat: pos.coords.latitude,
+            lon: pos.coords.longitude,
+            acc: pos.coords.accuracy
+          }),
+          (err) => resolve({error: err && err.message ? err.message : "permission denied"})
+        );
+      } catch (e) {
+        resolve({error: e.message || "unknown error"});
+      }
+    })
+    """
+    result = streamlit_js_eval(js_expressions=js, key="get_gps_v2", want_output=True)
+    if isinstance(result, dict) and "lat" in result and "lon" in result:
+        lat, lon = float(result["lat"]), float(result["lon"])
+        cached = st.session_state.get("meta_cached")
+        if cached and (_q(lat), _q(lon)) == (_q(cached["lat"]), _q(cached["lon"])):
+            # Same fix as before (within cache quantization): skip the
+            # reverse-geocode round-trip entirely.
+            meta = cached
+        else:
+            rev = reverse_geocode(lat, lon) or {}
+            meta = {
+                "name": rev.get("name"),
+                "admin1": rev.get("admin1"),
+                "country": rev.get("country"),
+                "lat": lat,
+                "lon": lon,
+                "timezone": rev.get("timezone"),
+                "source": "browser:gps",
+            }
+            st.session_state["meta_cached"] = meta
+        set_session_location(meta)
+        st.success(f"Browser location detected: **{lat:.4f}, {lon:.4f}**")
+    else:
+        st.warning("Could not fetch browser location. Please allow access and click again.")
+
+# 3) First load / fallback chain
+if "location" not in st.session_state:
+    # Key the raw IP result on its own session entry so a browser session
+    # asks the providers at most once, even if the data caches expire.
+    if "ip_meta" not in st.session_state:
+        st.session_state["ip_meta"] = ip_detect()
+    ip = dict(st.session_state["ip_meta"]) if st.session_state["ip_meta"] else None
+    if ip:
+        if ip.get("city"):
+            # Provider already named the city — no need to ask Nominatim.
+            ip["name"] = ip["city"]
+        else:
+            # Improve IP result with reverse geocode for nicer city label
+            rev = reverse_geocode(ip["lat"], ip["lon"]) or {}
+            ip["name"] = rev.get("name")
+            ip["admin1"] = rev.get("admin1") or ip.get("admin1")
+            ip["country"] = rev.get("country") or ip.get("country")
+        set_session_location(ip)
+        st.warning("⚠️ Using IP-based location (less accurate).")
+    else:
+        # hard fallback to Karachi
+        set_session_location(FALLBACK_LOCATION)
+        st.warning("Using strict fallback: Karachi.")
+
+# ======================= Display Active Location =======================
+meta = st.session_state["location"]
+st.subheader("📍 Active Location")
+
+cols = st.columns(4)
+cols[0].metric("Location", meta.get("name") or "—")
+cols[1].metric("Region", meta.get("admin1") or "—")
+cols[2].metric("Country", meta.get("country") or "—")
+cols[3].metric("Timezone", meta.get("timezone") or "—")
+
+st.caption(
+    f"Source: **{meta.get('source','?')}** • Coords: `{meta.get('lat'):.4f}, {meta.get('lon'):.4f}`"
+    if meta.get("lat") and meta.get("lon")
+    else f"Source: **{meta.get('source','?')}**"
+)
+
+# A tiny map pin (Streamlit's built-in map); a plain dict avoids building
+# a whole DataFrame for one row.
+try:
+    if meta.get("lat") is not None and meta.get("lon") is not None:
+        st.map({"lat": [meta["lat"]], "lon": [meta["lon"]]}, size=100, zoom=11)
+except Exception:
+    pass
+
+with st.expander("Debug: raw location dict"):
+    st.json(meta)
+
+# ======================= Results =======================
+if meta.get("lat") and meta.get("lon"):
+    with st.spinner("Fetching weather, attractions, restaurants, and news…"):
+        weather, attractions, restaurants, news = fetch_all(
+            meta, float(radius_km), int(max_restaurants), int(news_count)
+        )
+
+    # Persist the timezone Open-Meteo resolved for "auto" so every later
+    # weather call (and its cache key) uses the real zone name.
+    if weather and weather.get("timezone") and not meta.get("timezone"):
+        meta["timezone"] = weather["timezone"]
+        st.session_state["location"]["timezone"] = weather["timezone"]
+
+    # ---- Weather ----
+    st.subheader("🌤️ Weather")
+    if weather and weather.get("current"):
+        cur = weather["current"]
+        daily = weather.get("daily") or {}
+        wcols = st.columns(4)
+        wcols[0].metric("Temperature", f"{cur.get('temperature_2m', '—')} °C")
+        wcols[1].metric("Feels like", f"{cur.get('apparent_temperature', '—')} °C")
+        wcols[2].metric("Humidity", f"{cur.get('relative_humidity_2m', '—')} %")
+        wcols[3].metric("Wind", f"{cur.get('wind_speed_10m', '—')} km/h")
+        if daily.get("temperature_2m_max") and daily.get("temperature_2m_min"):
+            st.caption(
+                f"Today: high **{daily['temperature_2m_max'][0]} °C** / "
+                f"low **{daily['temperature_2m_min'][0]} °C**"
+            )
+    else:
+        st.info("Weather is unavailable right now.")
+
+    # ---- Attractions ----
+    st.subheader("🏛️ Nearby Attractions")
+    if attractions:
+        for a in attractions:
+            with st.expander(f"{a['title']} — {a['distance_km']} km"):
+                if a.get("summary"):
+                    st.write(a["summary"])
+                if a.get("url"):
+                    st.markdown(f"[Read on Wikipedia]({a['url']})")
+    else:
+        st.info("No attractions found nearby.")
+
+    # ---- Restaurants ----
+    st.subheader("🍽️ Restaurants")
+    if restaurants:
+        import pandas as pd
+
+        # Arrow-backed strings serialize faster over Streamlit's Arrow path.
+        r_df = pd.DataFrame(restaurants).convert_dtypes(dtype_backend="pyarrow")
+        st.dataframe(r_df, use_container_width=True, hide_index=True)
+    else:
+        st.info("No restaurants found in this radius.")
+
+    # ---- News ----
+    st.subheader("📰 Local News")
+    if news:
+        for item in news:
+            st.markdown(
+                f"- [{item.get('title')}]({item.get('link')}) "
+                f"<small>{item.get('published') or ''}</small>",
+                unsafe_allow_html=True,
+            )
+    else:
+        st.info("No news found for this location.")